@@ -209,7 +209,26 @@ Ensure there are no missing commas and brackets, which are causing errors
 in validation like duplicate keys as the bracket are not closed. Specifically, the response should have properly closed objects and arrays.
 """
 
-PROMPT ="""Please extract the relevant information from the attached PDF question paper, and return the 
+BATCH_PROMPT ="""You will receive a JSON array where each element is an object of the form
+    {"index": <number>, "text": "<plain text of one question paper>"}.
+    For EACH element, extract the relevant information from its question paper text and build a paper
+    object following the Paper Model described in the system instruction.
+    Return strictly a valid JSON array where each element is an object of the form
+    {"index": <number>, "paper": <the extracted paper object>}.
+    Ensure the following:
+    1. The "index" of every returned element must match the "index" of the input element its paper
+      was extracted from. Do not rely on ordering, always echo the index back.
+    2. Return exactly one element per input element. If a paper cannot be extracted from some input,
+      return {"index": <number>, "paper": null} for it.
+    3. Replace all newline characters (e.g., '\\n') with appropriate spaces to maintain JSON
+      formatting.
+    4. Ensure that all keys and string values are enclosed in double quotes, and that commas are
+      properly placed between key-value pairs.
+    5. Ensure there are no syntax errors like missing commas, missing quotes, brackets or other
+      formatting issues. The final output must be error-free and a valid JSON array that can be
+      parsed without issues."""
+
+PROMPT ="""Please extract the relevant information from the attached PDF question paper, and return the
     data strictly in valid JSON format.
     Ensure the following: "
     1. Replace all newline characters (e.g., '\\n') with appropriate spaces to maintain JSON 
@@ -7,6 +7,7 @@ routers, and defines the root endpoint.
 from fastapi import FastAPI
 from .routes.sample_paper_routes import router as sample_paper_router
 from .routes.data_extract_routes import router as data_extract_router
+from .configs.database import db
 from .configs.logs import logger
 
 logger.debug("FastAPI app initialized")
@@ -15,6 +16,21 @@ app = FastAPI()
 app.include_router(sample_paper_router)
 app.include_router(data_extract_router)
 
+@app.on_event("startup")
+async def create_indexes():
+    """
+    Create the indexes the API relies on.
+
+    A TTL index expires /extract/text idempotency cache entries after a day,
+    another expires finished task documents after a week so the task_status
+    working set stays bounded, and a compound (status, updated_at) index backs
+    admin scans over recent tasks.
+    """
+    await db['paper_cache'].create_index("created_at", expireAfterSeconds=86400)
+    await db['task_status'].create_index("created_at", expireAfterSeconds=7*86400)
+    await db['task_status'].create_index([("status", 1), ("updated_at", -1)])
+    logger.debug("Indexes created")
+
 @app.get("/")
 async def root():
     "Root endpoint of the API"
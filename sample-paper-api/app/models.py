@@ -5,7 +5,7 @@ This module defines the data models used for validating and serializing
 various fields in the application.
 """
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 class ParamsModel(BaseModel):
     "Model representing parameters for a given board, subject and grade."
@@ -40,6 +40,9 @@ class PaperModel(BaseModel):
     chapters: List[str]
     sections: List[SectionModel]
 
+"Pre-compiled validator for PaperModel, shared by the extraction paths so the core schema is built once."
+paper_adapter = TypeAdapter(PaperModel)
+
 class UpdatePaperModel(BaseModel):
     "Model representing complete PaperModel with its attributes"
     title: Optional[str] = {}
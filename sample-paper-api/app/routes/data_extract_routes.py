@@ -4,45 +4,61 @@ Sample paper routes for ZuAI Sample Paper FastAPI application.
 This module defines the API endpoints for extracting data for
 sample papers from PDF and Plain Text Input.
 """
-import json
+import asyncio
+import hashlib
+import orjson
 import os
-import aiofiles
 import string
-import google.generativeai as genai
+from datetime import datetime
+from functools import lru_cache
 from bson import ObjectId
+from cachetools import TTLCache
 from pydantic import ValidationError
 from dotenv import load_dotenv
 from pymongo.errors import PyMongoError
 
 from fastapi.responses import JSONResponse
-from fastapi import APIRouter, Body, HTTPException,File, Request, UploadFile, BackgroundTasks
+from fastapi import APIRouter, Body, HTTPException,File, Request, Response, UploadFile
 
 from ..rate_limiter import rate_limit
-from ..models import PaperModel, TaskStatusResponseModel
+from ..models import TaskStatusResponseModel, paper_adapter
 #from ..config import db, INSTRUCTION, PROMPT, safe
 from ..configs.database import db
-from ..configs.gemini_inputs import INSTRUCTION, PROMPT, safe
+from ..configs.gemini_inputs import BATCH_PROMPT
 from ..configs.logs import logger
+from ..services import gemini_client
+from ..workers import pdf_extraction_task
 
 load_dotenv()
 
 paper_collection = db['sample_papers']
 task_collection = db['task_status']
-
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel(
-    model_name="models/gemini-1.5-flash",
-    system_instruction=INSTRUCTION,
-    generation_config=({"response_mime_type": "application/json"}),
-    safety_settings = safe)
+paper_cache_collection = db['paper_cache']
 
 router = APIRouter()
 
-def update_task_status(task_id, status, description):
+"""Batch limits for coalesced text extraction. The binding constraint is the
+shared per-minute token budget (TPM_LIMIT in gemini_client): at ~4 chars per
+token, TEXT_BATCH_MAX_CHARS keeps one marshaled prompt around 200k tokens,
+comfortably inside the 250k budget even with BATCH_PROMPT on top."""
+TEXT_BATCH_SIZE = 8
+TEXT_BATCH_WAIT = 0.05
+TEXT_BATCH_MAX_CHARS = 800_000
+
+"Largest /extract/text body accepted; keeps any single input well inside the per-minute token budget."
+MAX_TEXT_CHARS = 200_000
+
+text_batch_queue: asyncio.Queue = asyncio.Queue()
+text_batch_worker = None
+"Overflow item held back from a full batch, used as the first item of the next one."
+text_batch_carry = None
+
+async def update_task_status(task_id, status, description):
     """
     Update the status of a background task in the database.
 
-    This function updates the status and description of a task in the task collection.
+    Async counterpart of the worker-side helper, using the Motor collection bound
+    to the API process's event loop.
 
     Args:
         task_id (str): The ID of the task to update.
@@ -51,117 +67,173 @@ def update_task_status(task_id, status, description):
     """
     logger.info(f"Updating task status for task_id: {task_id}, status: {status}")
     query = {"_id":ObjectId(task_id)}
-    update_data = {"$set": {"status": status, "description":description}}
-    task_collection.update_one(query, update_data)
+    update_data = {"$set": {"status": status, "description":description, "updated_at": datetime.utcnow()}}
+    await task_collection.update_one(query, update_data)
 
-def generate_sample_paper(sample_pdf, task_id: str):
-    """
-    Generate a sample paper using the Generative AI model.
+"Remember recent 'no such task' lookups briefly so tight client polls skip Mongo."
+_missing_task_cache = TTLCache(maxsize=4096, ttl=30)
 
-    This function takes a PDF file and generates a sample paper based on its content.
+@lru_cache(maxsize=1024)
+def _oid(task_id: str) -> ObjectId:
+    "Parse a task ID into an ObjectId, memoized across the repeat polls of one task."
+    return ObjectId(task_id)
 
-    Args:
-        sample_pdf (str): The PDF file content to be processed.
-        task_id (str): The ID of the task for logging purposes.
+def _cache_key(input_data: str) -> str:
+    "Idempotency key for a text-extraction input: SHA-256 hex digest of the body."
+    return hashlib.sha256(input_data.encode()).hexdigest()
 
-    Returns:
-        str: The generated sample paper content.
+async def _cache_paper_ids(pending, inserted_ids):
+    """
+    Record input-hash to paper_id mappings for inserted papers.
 
-    Raises:
-        Exception: If there is an error during content generation.
+    Duplicate keys (the same input already cached or repeated within one batch)
+    are ignored so caching never fails an otherwise successful extraction.
+
+    Args:
+        pending (list): (future, cache_key) tuples aligned with the inserted documents.
+        inserted_ids (list): The ObjectIds returned by insert_many, in the same order.
     """
-    logger.info(f"Generating sample paper for task_id: {task_id}")
+    cache_docs = [{"_id": key, "paper_id": str(paper_id), "created_at": datetime.utcnow()}
+        for (_, key), paper_id in zip(pending, inserted_ids)]
     try:
-        response = model.generate_content([PROMPT, sample_pdf])
-        if response.parts:
-            response_text = response.text
-            response = response_text
-            return response
-    except Exception as e:
-        logger.error(f"Error during content generation for task_id: {task_id}: {e}")
-        update_task_status(task_id, status='Failed', description="Error during Content generation")
+        await paper_cache_collection.insert_many(cache_docs, ordered=False)
+    except PyMongoError as pme:
+        logger.warning(f"Could not cache text-extraction results: {pme}")
 
-def insert_sample_paper(response: dict, task_id: str):
+async def _drain_text_batch():
     """
-    Insert the generated sample paper into the MongoDB collection.
-
-    This function takes the generated paper response and inserts it into the sample papers collection.
+    Collect queued text-extraction requests into one batch.
 
-    Args:
-        response (dict): The generated sample paper data.
-        task_id (str): The ID of the task for logging purposes.
+    Waits for the first queued item, then keeps draining until TEXT_BATCH_SIZE
+    items are collected, TEXT_BATCH_WAIT seconds have passed, or the cumulative
+    input size would push the marshaled prompt past TEXT_BATCH_MAX_CHARS. An item
+    that would overflow the batch is held back and leads the next batch, so every
+    dispatched prompt stays inside the per-minute token budget.
 
-    Raises:
-        ValidationError: If the generated data does not conform to the PaperModel schema.
-        PyMongoError: If there is an error while inserting the data into MongoDB.
-        Exception: For any other unexpected errors.
+    Returns:
+        list: A list of (input_data, future) tuples for one Gemini call.
     """
-    logger.info(f"Inserting sample paper into the database for task_id: {task_id}")
-    try:
-        sample_paper = PaperModel(**response)
-        paper_collection.insert_one(sample_paper.model_dump())
-        logger.info(f"Sample paper inserted successfully for task_id: {task_id}")
-        return True
-    except ValidationError as ve:
-        logger.error(f"Validation error for task_id: {task_id}: {ve}")
-        update_task_status(task_id, status='Failed', description="Invalid response received")
-    except PyMongoError as pme:
-        logger.error(f"Database error for task_id: {task_id}: {pme}")
-        update_task_status(task_id, status='Failed', description="Database error")
-    except Exception as e:
-        logger.error(f"Internal Server error for task_id: {task_id}: {e}")
-        update_task_status(task_id, status="Failed", description="Internal Server Error")
+    global text_batch_carry
+    loop = asyncio.get_running_loop()
+    if text_batch_carry is not None:
+        batch = [text_batch_carry]
+        text_batch_carry = None
+    else:
+        batch = [await text_batch_queue.get()]
+    total_chars = len(batch[0][0])
+    deadline = loop.time() + TEXT_BATCH_WAIT
+    while len(batch) < TEXT_BATCH_SIZE:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(text_batch_queue.get(), timeout=remaining)
+        except asyncio.TimeoutError:
+            break
+        if total_chars + len(item[0]) > TEXT_BATCH_MAX_CHARS:
+            text_batch_carry = item
+            break
+        batch.append(item)
+        total_chars += len(item[0])
+    return batch
+
+async def text_batch_worker_loop():
+    """
+    Background task that coalesces text-extraction requests into single Gemini calls.
 
-def pdf_extraction_background_task(file_location: str, task_id:str):
+    Each drained batch is marshaled into one numbered JSON array prompt, sent to the
+    model once, and the validated papers are bulk-inserted with a single
+    insert_many before the outcome is fanned back to the awaiting callers through
+    their futures. Keeps both the Gemini request count and the Mongo round-trips
+    down to one per batch instead of one per HTTP request.
     """
-    Background task to process PDF extraction and insert the generated sample paper into the database.
+    while True:
+        batch = await _drain_text_batch()
+        logger.info(f"Dispatching batched text extraction for {len(batch)} request(s)")
+        try:
+            inputs = orjson.dumps([{"index": i, "text": input_data}
+                for i, (input_data, _) in enumerate(batch)]).decode()
+            response = await gemini_client.generate([BATCH_PROMPT, inputs])
+            results = orjson.loads(response.text)
+            papers = {result.get("index"): result.get("paper") for result in results}
+            docs = []
+            pending = []
+            for i, (input_data, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if papers.get(i) is None:
+                    future.set_exception(HTTPException(status_code=502,
+                        detail="No response received from model for this input."))
+                    continue
+                try:
+                    sample_paper = paper_adapter.validate_python(papers[i])
+                except ValidationError as ve:
+                    logger.error(f"Validation error in batched text extraction: {ve}")
+                    future.set_exception(HTTPException(status_code=422,
+                        detail="Data Validation error occured."))
+                    continue
+                docs.append(paper_adapter.dump_python(sample_paper))
+                pending.append((future, _cache_key(input_data)))
+            if docs:
+                "ordered=False lets Mongo apply the valid documents even if one insert fails."
+                result = await paper_collection.insert_many(docs, ordered=False)
+                await _cache_paper_ids(pending, result.inserted_ids)
+                for future, _ in pending:
+                    future.set_result(True)
+        except Exception as e:
+            logger.error(f"Error during batched text extraction: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
-    This function handles the PDF extraction process and generates a sample paper from it.
+"Largest upload accepted by /extract/pdf; bigger streams are aborted mid-copy."
+MAX_PDF_BYTES = 25 * (1 << 20)
 
-    Args:
-        file_location (str): The location of the PDF file to process.
-        task_id (str): The ID of the task for logging purposes.
+def _copy_to_disk(src, dst: str):
+    """
+    Stream a file object to disk in 1 MiB chunks. Meant to be dispatched once via asyncio.to_thread.
 
-    Raises:
-        Exception: If there are errors during PDF extraction or sample paper insertion.
+    Checks the PDF magic bytes on the first chunk and aborts as soon as the stream
+    exceeds MAX_PDF_BYTES, so oversized or mislabeled uploads never reach the
+    expensive Gemini pipeline. Partial files are removed on rejection.
     """
-    logger.info(f"Starting background task for PDF extraction for task_id: {task_id}")
+    total = 0
+    first_chunk = True
     try:
-        sample_pdf = genai.upload_file(file_location)
-        response = generate_sample_paper(sample_pdf, task_id)
-        if response:
-            try:
-                response = json.loads(response)
-            except json.JSONDecodeError as json_err:
-                logger.error(f"JSON decode error for task_id: {task_id}: {json_err}")
-                update_task_status(task_id, status='Failed', description="Invalid JSON Response")
-            response = insert_sample_paper(response, task_id)
-            if response:
-                update_task_status(task_id, status='Completed',
-                description="Sample paper extracted and saved successfully")
-            update_task_status(task_id, status='Failed', description="Invalid JSON Response received from generator")
-    except PyMongoError as pme:
-        logger.error(f"Database error for task_id: {task_id}: {pme}")
-        update_task_status(task_id, status='Failed', description="Database error occured")
-    except Exception as e:
-        logger.error(f"Internal Server error for task_id: {task_id}: {e}")
-        update_task_status(task_id, status='Failed', description="Internal Server error")
+        with open(dst, 'wb') as f:
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                if first_chunk:
+                    if not chunk.startswith(b'%PDF-'):
+                        raise HTTPException(status_code=415, detail="File content is not a valid PDF.")
+                    first_chunk = False
+                total += len(chunk)
+                if total > MAX_PDF_BYTES:
+                    raise HTTPException(status_code=413, detail="PDF exceeds the maximum allowed size.")
+                f.write(chunk)
+            if first_chunk:
+                "Empty stream: no chunk ever reached the magic-byte check above."
+                raise HTTPException(status_code=415, detail="File content is not a valid PDF.")
+    except HTTPException:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
 
 @router.post('/extract/pdf')
 @rate_limit(limit=2, time_window=60)
 async def extract_pdf(
     request:Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...)
     ):
     """
-    Handle PDF file upload and initiate a background task for extraction.
+    Handle PDF file upload and enqueue a worker task for extraction.
 
-    This endpoint allows the user to upload a PDF file, which will be processed in the background.
+    This endpoint allows the user to upload a PDF file, which will be processed by a Dramatiq worker.
 
     Args:
         request (Request): The incoming request object.
-        background_tasks (BackgroundTasks): The background tasks manager to handle long-running tasks.
         file (UploadFile): The uploaded PDF file.
 
     Returns:
@@ -171,29 +243,34 @@ async def extract_pdf(
         HTTPException: If the file type is invalid or if an error occurs during processing.
     """
     logger.info(f"Received PDF extraction request: {file.filename}")
+    task_id = None
     try:
         if file.content_type != "application/pdf":
             logger.warning("Invalid file type uploaded. Only PDFs are allowed.")
             raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
         file_location = f"data/input/{file.filename}"
         os.makedirs(os.path.dirname(file_location), exist_ok=True)
-        async with aiofiles.open(file_location, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        await asyncio.to_thread(_copy_to_disk, file.file, file_location)
         try:
-            query = {"status": "In Progress", "description": "PDF extraction is in process..."}
+            query = {"status": "In Progress", "description": "PDF extraction is in process...",
+                "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
             task = await task_collection.insert_one(query)
             task_id = task.inserted_id
             logger.info(f"Task created for PDF extraction, task_id: {task_id}")
         except Exception as e:
             logger.error(f"Error initializing task for PDF extraction: {e}")
             raise HTTPException(status_code=500, detail="Error initializing task") from e
-        background_tasks.add_task(pdf_extraction_background_task, file_location, task_id)
+        pdf_extraction_task.send(file_location, str(task_id))
         return JSONResponse(status_code=202,
             content={"message": f"The request for PDF extraction is accepted and is under progress.Please check the task status using Task ID: {task_id}"})
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Operation failed due to internal error for task_id: {task_id}: {e}")
-        await update_task_status(task_id, status='Failed', description="Operation failed due to internal error.")
+        if task_id is not None:
+            logger.error(f"Operation failed due to internal error for task_id: {task_id}: {e}")
+            await update_task_status(task_id, status='Failed', description="Operation failed due to internal error.")
+        else:
+            logger.error(f"Operation failed due to internal error before task creation: {e}")
         raise HTTPException(status_code=500, detail="Operation failed due to internal error.") from e
     
 @router.post('/extract/text')
@@ -220,32 +297,83 @@ async def extract_text(request:Request, input_data: str = Body(...)):
         if not isinstance(input_data, str):
             logger.warning("Invalid input type. Only plain text is allowed.")
             raise HTTPException(status_code=400, detail="Only plain text are allowed.")
-        response = model.generate_content([PROMPT, input_data])
-        response = response.text
-        try:
-            sample_paper = PaperModel(**json.loads(response))
-        except ValidationError as ve:
-            logger.error(f"Validation error: {ve}")
-            raise HTTPException(status_code=422, detail="Data Validation error occured.") from ve
-        paper_collection.insert_one(sample_paper.model_dump())
+        if len(input_data) > MAX_TEXT_CHARS:
+            logger.warning(f"Text input of {len(input_data)} characters exceeds the allowed size.")
+            raise HTTPException(status_code=413, detail="Text input exceeds the maximum allowed size.")
+        cached = await paper_cache_collection.find_one({"_id": _cache_key(input_data)})
+        if cached:
+            logger.info(f"Returning cached extraction for repeated input, paper_id: {cached['paper_id']}")
+            return {"message": "Sample paper extracted and saved successfully"}
+        global text_batch_worker
+        if text_batch_worker is None:
+            text_batch_worker = asyncio.create_task(text_batch_worker_loop())
+        future = asyncio.get_running_loop().create_future()
+        await text_batch_queue.put((input_data, future))
+        await future
         logger.info("Sample paper extracted and saved successfully")
         return {"message": "Sample paper extracted and saved successfully"}
-    except json.JSONDecodeError as exc:
+    except orjson.JSONDecodeError as exc:
         logger.error(f"Invalid JSON response from model: {exc}")
         raise HTTPException(status_code=400, detail="Invalid JSON response from model.") from exc
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Internal Server Error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error.") from e
 
+"Longest time a single /tasks long-poll is allowed to block, in seconds."
+TASK_POLL_MAX_WAIT = 30
+
+async def _wait_for_task_update(task_id: str, wait: int, status: str, description: str):
+    """
+    Long-poll a task through a Mongo change stream.
+
+    Blocks up to `wait` seconds on updates to the given task document and returns
+    the new (status, description) as soon as one lands, or the current values on
+    timeout or if change streams are unavailable. The document is re-read once
+    after the stream opens, so an update landing between the caller's read and
+    the watch starting is returned immediately instead of being missed.
+
+    Args:
+        task_id (str): The ID of the task to watch.
+        wait (int): The maximum number of seconds to block.
+        status (str): The task's current status, returned on timeout.
+        description (str): The task's current description, returned on timeout.
+
+    Returns:
+        tuple: The latest (status, description) for the task.
+    """
+    pipeline = [{"$match": {"documentKey._id": _oid(task_id), "operationType": "update"}}]
+    try:
+        async with task_collection.watch(pipeline, full_document='updateLookup',
+                max_await_time_ms=wait * 1000) as stream:
+            task = await task_collection.find_one({"_id": _oid(task_id)},
+                {"status": 1, "description": 1, "_id": 0})
+            if task and task.get("status", status) != status:
+                return task.get("status", status), task.get("description", description)
+            change = await asyncio.wait_for(stream.next(), timeout=wait)
+            document = change.get("fullDocument") or {}
+            return document.get("status", status), document.get("description", description)
+    except asyncio.TimeoutError:
+        return status, description
+    except PyMongoError as pme:
+        logger.warning(f"Change stream unavailable for task_id: {task_id}: {pme}")
+        return status, description
+
 @router.get('/tasks/{task_id}', response_model=TaskStatusResponseModel)
-async def task_status(task_id: str):
+async def task_status(task_id: str, response: Response, wait: int = 0):
     """
     Retrieve the status of a background task by its ID.
 
     This endpoint checks the status and description of a task identified by the given task ID.
+    Pass `wait` (seconds) to long-poll: the response blocks until the status changes or the
+    wait expires, cutting tight polling loops down to one request per transition. Responses
+    for still-running tasks carry a Retry-After header.
 
     Args:
         task_id (str): The ID of the task to check the status for.
+        response (Response): The outgoing response, used to set the Retry-After header.
+        wait (int): How many seconds to block waiting for a status change. Defaults to 0.
 
     Returns:
         TaskStatusResponseModel: The status and description of the specified task.
@@ -258,14 +386,26 @@ async def task_status(task_id: str):
         if not ObjectId.is_valid(task_id):
             logger.warning(f"Invalid Task ID format: {task_id}")
             raise HTTPException(status_code=400, detail="Invalid Task ID format")
-        query = {"_id": ObjectId(task_id)}
-        task = await task_collection.find_one(query)
+        if task_id in _missing_task_cache:
+            logger.warning(f"No such task exists (cached): {task_id}")
+            raise HTTPException(status_code=400, detail="No such Task exists")
+        query = {"_id": _oid(task_id)}
+        "Project down to the two fields the response uses; task docs also carry batch-job metadata."
+        task = await task_collection.find_one(query, {"status": 1, "description": 1, "_id": 0})
         if not task:
+            _missing_task_cache[task_id] = True
             logger.warning(f"No such task exists: {task_id}")
             raise HTTPException(status_code=400, detail="No such Task exists")
         task_status = task.get("status", "Unknown. Please wait as we are looking into the issue...")
         task_description = task.get("description", "Unknown. Please wait as we are looking into the issue...")
+        if wait > 0 and task_status == 'In Progress':
+            task_status, task_description = await _wait_for_task_update(
+                task_id, min(wait, TASK_POLL_MAX_WAIT), task_status, task_description)
+        if task_status == 'In Progress':
+            response.headers["Retry-After"] = "5"
         return TaskStatusResponseModel(task_id=task_id, status=task_status, description=task_description)
+    except HTTPException:
+        raise
     except ValidationError as ve:
         logger.error(f"Validation error for task_id: {task_id}: {ve}")
         raise HTTPException(status_code=422, detail="Invalid input data") from ve
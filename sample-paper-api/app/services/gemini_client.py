@@ -0,0 +1,109 @@
+"""
+Shared Gemini client for ZuAI Sample Paper FastAPI application.
+
+This module centralizes interactive Gemini access behind a single sliding-window
+rate limiter so every endpoint draws from the same RPM/TPM budget instead of
+exhausting it independently, and retries 429 responses with jittered
+exponential backoff.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+
+from ..configs.gemini_inputs import INSTRUCTION, safe
+from ..configs.logs import logger
+
+load_dotenv()
+
+"Free-tier budget for gemini-1.5-flash: requests and tokens per minute."
+RPM_LIMIT = 10
+TPM_LIMIT = 250_000
+MAX_RETRIES = 5
+
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+
+"Built once so the SDK does not coerce a config dict on every generate_content call."
+generation_config = genai.types.GenerationConfig(response_mime_type="application/json")
+
+model = genai.GenerativeModel(
+    model_name="models/gemini-1.5-flash",
+    system_instruction=INSTRUCTION,
+    generation_config=generation_config,
+    safety_settings = safe)
+
+"Sliding one-minute window of (timestamp, estimated tokens) per issued request."
+_request_log = deque()
+_rate_lock = asyncio.Lock()
+
+"Concurrency gate so blocking SDK calls cannot tie up the whole thread pool."
+GEMINI_CONCURRENCY = 4
+_gemini_semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+def _estimate_tokens(prompt_parts) -> int:
+    "Rough token estimate for rate accounting, about four characters per token."
+    return sum(len(str(part)) for part in prompt_parts) // 4
+
+async def _acquire_budget(tokens: int):
+    """
+    Block until the shared RPM/TPM window has room for one more request.
+
+    Prunes entries older than sixty seconds from the window and, whenever either
+    the request or token budget is exhausted, sleeps until the oldest entry
+    expires before checking again.
+
+    Args:
+        tokens (int): The estimated token cost of the request to admit.
+    """
+    while True:
+        async with _rate_lock:
+            now = time.monotonic()
+            while _request_log and now - _request_log[0][0] > 60:
+                _request_log.popleft()
+            tokens_used = sum(t for _, t in _request_log)
+            if len(_request_log) < RPM_LIMIT and tokens_used + tokens <= TPM_LIMIT:
+                _request_log.append((now, tokens))
+                return
+            wait_time = 60 - (now - _request_log[0][0]) if _request_log else 1
+        logger.info(f"Gemini rate budget exhausted, waiting {wait_time:.1f}s for a slot")
+        await asyncio.sleep(max(wait_time, 0.1))
+
+async def generate(prompt_parts):
+    """
+    Generate content with the shared Gemini model under global rate accounting.
+
+    This function acquires a slot in the shared RPM/TPM window before each call
+    and retries rate-limited calls with jittered exponential backoff.
+
+    Args:
+        prompt_parts (list): The prompt parts to pass to the model.
+
+    Returns:
+        The model response.
+
+    Raises:
+        ValueError: If the prompt's token estimate alone exceeds the per-minute
+            budget, since such a request could never be admitted.
+        google_exceptions.ResourceExhausted: If the call is still rate limited
+            after MAX_RETRIES attempts.
+        Exception: If there is any other error during content generation.
+    """
+    tokens = _estimate_tokens(prompt_parts)
+    if tokens > TPM_LIMIT:
+        raise ValueError(f"Estimated prompt size ({tokens} tokens) exceeds the {TPM_LIMIT} per-minute token budget")
+    for attempt in range(MAX_RETRIES):
+        await _acquire_budget(tokens)
+        try:
+            async with _gemini_semaphore:
+                return await asyncio.to_thread(model.generate_content, prompt_parts)
+        except google_exceptions.ResourceExhausted as re:
+            if attempt == MAX_RETRIES - 1:
+                logger.error(f"Gemini call still rate limited after {MAX_RETRIES} attempts: {re}")
+                raise
+            backoff = min(2 ** attempt, 30) + random.uniform(0, 1)
+            logger.warning(f"Gemini call rate limited, retrying in {backoff:.1f}s: {re}")
+            await asyncio.sleep(backoff)
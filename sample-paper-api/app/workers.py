@@ -0,0 +1,227 @@
+"""
+Dramatiq workers for ZuAI Sample Paper FastAPI application.
+
+This module configures the Redis-backed Dramatiq broker and defines the
+background actors that submit PDF extraction jobs to the Gemini Batch API
+and poll them to completion, so the API process only enqueues and returns.
+
+The actors are synchronous callables, so they use a synchronous pymongo
+client of their own: the shared Motor client binds to the event loop of its
+first operation, which a short-lived per-invocation loop would close and
+break every later call.
+
+Run the workers as a separate process with: dramatiq app.workers
+"""
+import hashlib
+import orjson
+import os
+from datetime import datetime
+import dramatiq
+from google import genai as batch_genai
+from bson import ObjectId
+from dotenv import load_dotenv
+from dramatiq.brokers.redis import RedisBroker
+from pydantic import ValidationError
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from .models import paper_adapter
+from .configs.database import CONNECTION_STRING
+from .configs.gemini_inputs import INSTRUCTION, PROMPT, safe
+from .configs.logs import logger
+
+load_dotenv()
+
+client = MongoClient(CONNECTION_STRING)
+db = client["sample_paper_db"]
+paper_collection = db['sample_papers']
+task_collection = db['task_status']
+
+"Client for the Gemini Batch API, used for the non-interactive PDF pipeline."
+batch_client = batch_genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+
+"How long to wait between two polls of a pending batch job."
+BATCH_POLL_INTERVAL_MS = 30_000
+
+redis_broker = RedisBroker(url="redis://localhost:6379")
+dramatiq.set_broker(redis_broker)
+
+def _hash_pdf(file_location: str) -> str:
+    """
+    Compute the SHA-256 hex digest of a file.
+
+    Uses hashlib.file_digest (Python 3.11+), which hashes in C without a
+    Python-level chunk loop, with a manual chunked fallback for older runtimes.
+    """
+    with open(file_location, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        sha = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+        return sha.hexdigest()
+
+def _upload_pdf(file_location: str, pdf_sha: str):
+    """
+    Upload a PDF to Gemini, reusing a previously uploaded file handle when possible.
+
+    Looks up the content hash on earlier task documents; on a hit the stored file
+    handle is fetched with files.get instead of re-uploading the same bytes, which
+    saves an entire network upload on queue redeliveries and retries.
+
+    Args:
+        file_location (str): The location of the PDF file to upload.
+        pdf_sha (str): The SHA-256 hex digest of the PDF content.
+
+    Returns:
+        The Gemini file handle for the PDF.
+    """
+    query = {"pdf_sha": pdf_sha, "gemini_file_name": {"$exists": True}}
+    cached = task_collection.find_one(query, {"gemini_file_name": 1})
+    if cached:
+        try:
+            sample_pdf = batch_client.files.get(name=cached["gemini_file_name"])
+            logger.info(f"Reusing uploaded Gemini file {cached['gemini_file_name']} for pdf_sha: {pdf_sha}")
+            return sample_pdf
+        except Exception as e:
+            logger.warning(f"Cached Gemini file {cached['gemini_file_name']} unavailable, re-uploading: {e}")
+    return batch_client.files.upload(file=file_location)
+
+def update_task_status(task_id, status, description):
+    """
+    Update the status of a background task in the database.
+
+    This function updates the status and description of a task in the task collection.
+
+    Args:
+        task_id (str): The ID of the task to update.
+        status (str): The new status for the task.
+        description (str): A description providing additional information about the task's status.
+    """
+    logger.info(f"Updating task status for task_id: {task_id}, status: {status}")
+    query = {"_id":ObjectId(task_id)}
+    update_data = {"$set": {"status": status, "description":description, "updated_at": datetime.utcnow()}}
+    task_collection.update_one(query, update_data)
+
+def insert_sample_paper(response: dict, task_id: str):
+    """
+    Insert the generated sample paper into the MongoDB collection.
+
+    This function takes the generated paper response and inserts it into the sample papers collection.
+
+    Args:
+        response (dict): The generated sample paper data.
+        task_id (str): The ID of the task for logging purposes.
+
+    Raises:
+        ValidationError: If the generated data does not conform to the PaperModel schema.
+        PyMongoError: If there is an error while inserting the data into MongoDB.
+        Exception: For any other unexpected errors.
+    """
+    logger.info(f"Inserting sample paper into the database for task_id: {task_id}")
+    try:
+        sample_paper = paper_adapter.validate_python(response)
+        paper_collection.insert_one(paper_adapter.dump_python(sample_paper))
+        logger.info(f"Sample paper inserted successfully for task_id: {task_id}")
+        return True
+    except ValidationError as ve:
+        logger.error(f"Validation error for task_id: {task_id}: {ve}")
+        update_task_status(task_id, status='Failed', description="Invalid response received")
+    except PyMongoError as pme:
+        logger.error(f"Database error for task_id: {task_id}: {pme}")
+        update_task_status(task_id, status='Failed', description="Database error")
+    except Exception as e:
+        logger.error(f"Internal Server error for task_id: {task_id}: {e}")
+        update_task_status(task_id, status="Failed", description="Internal Server Error")
+
+@dramatiq.actor
+def pdf_extraction_task(file_location: str, task_id: str):
+    """
+    Dramatiq actor to submit a PDF extraction job to the Gemini Batch API.
+
+    This actor uploads the PDF, creates a batch job for it (50% lower cost and much
+    higher rate limits than the interactive API), stores the job name on the task
+    document and schedules check_batch_job to poll it to completion.
+
+    Args:
+        file_location (str): The location of the PDF file to process.
+        task_id (str): The ID of the task for logging purposes.
+
+    Raises:
+        Exception: If there are errors during upload or batch job creation.
+    """
+    logger.info(f"Submitting batch PDF extraction job for task_id: {task_id}")
+    try:
+        pdf_sha = _hash_pdf(file_location)
+        sample_pdf = _upload_pdf(file_location, pdf_sha)
+        batch_job = batch_client.batches.create(
+            model="models/gemini-1.5-flash",
+            src=[{
+                "contents": [{"parts": [
+                    {"text": PROMPT},
+                    {"file_data": {"file_uri": sample_pdf.uri, "mime_type": "application/pdf"}},
+                ]}],
+                "config": {
+                    "system_instruction": INSTRUCTION,
+                    "response_mime_type": "application/json",
+                    "safety_settings": safe,
+                },
+            }])
+        query = {"_id": ObjectId(task_id)}
+        update_data = {"$set": {"batch_job_name": batch_job.name,
+            "pdf_sha": pdf_sha, "gemini_file_name": sample_pdf.name}}
+        task_collection.update_one(query, update_data)
+        logger.info(f"Batch job {batch_job.name} created for task_id: {task_id}")
+        check_batch_job.send_with_options(args=(batch_job.name, task_id), delay=BATCH_POLL_INTERVAL_MS)
+    except PyMongoError as pme:
+        logger.error(f"Database error for task_id: {task_id}: {pme}")
+        update_task_status(task_id, status='Failed', description="Database error occured")
+    except Exception as e:
+        logger.error(f"Internal Server error for task_id: {task_id}: {e}")
+        update_task_status(task_id, status='Failed', description="Internal Server error")
+
+@dramatiq.actor
+def check_batch_job(batch_job_name: str, task_id: str):
+    """
+    Dramatiq actor to poll a Gemini batch job and finish the task when it completes.
+
+    While the job is still pending or running, the actor re-enqueues itself with a
+    delay. On success it parses the returned response and inserts the generated
+    sample paper into the database.
+
+    Args:
+        batch_job_name (str): The name of the Gemini batch job to poll.
+        task_id (str): The ID of the task for logging purposes.
+
+    Raises:
+        Exception: If there are errors while polling or inserting the sample paper.
+    """
+    logger.info(f"Polling batch job {batch_job_name} for task_id: {task_id}")
+    try:
+        batch_job = batch_client.batches.get(name=batch_job_name)
+        if batch_job.state.name in ("JOB_STATE_QUEUED", "JOB_STATE_PENDING", "JOB_STATE_RUNNING"):
+            check_batch_job.send_with_options(args=(batch_job_name, task_id), delay=BATCH_POLL_INTERVAL_MS)
+            return
+        if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+            logger.error(f"Batch job {batch_job_name} ended in state {batch_job.state.name} for task_id: {task_id}")
+            update_task_status(task_id, status='Failed', description="Batch extraction job failed")
+            return
+        response = batch_job.dest.inlined_responses[0].response.text
+        if response:
+            try:
+                response = orjson.loads(response)
+            except orjson.JSONDecodeError as json_err:
+                logger.error(f"JSON decode error for task_id: {task_id}: {json_err}")
+                update_task_status(task_id, status='Failed', description="Invalid JSON Response")
+                return
+            if insert_sample_paper(response, task_id):
+                update_task_status(task_id, status='Completed',
+                description="Sample paper extracted and saved successfully")
+        else:
+            update_task_status(task_id, status='Failed', description="Invalid JSON Response received from generator")
+    except PyMongoError as pme:
+        logger.error(f"Database error for task_id: {task_id}: {pme}")
+        update_task_status(task_id, status='Failed', description="Database error occured")
+    except Exception as e:
+        logger.error(f"Internal Server error for task_id: {task_id}: {e}")
+        update_task_status(task_id, status='Failed', description="Internal Server error")